@@ -1,7 +1,158 @@
 import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import cv2
 import numpy as np
+from numba import njit, types
 from PIL import Image
-import pytesseract
+from tesserocr import PyTessBaseAPI, PSM, OEM
+
+# Tesseract is single-threaded on these tiny crops, so letters are recognized
+# concurrently across a few threads (tesserocr releases the GIL while recognizing)
+_OCR_WORKERS = min(4, os.cpu_count() or 1)
+_OCR_POOL = ThreadPoolExecutor(max_workers=_OCR_WORKERS)
+
+# PyTessBaseAPI is not thread-safe: each pool thread keeps its own instance, so the
+# model is loaded once per thread instead of once per recognized image
+_tess_local = threading.local()
+
+_WHITESPACE = re.compile(r'\s+')
+
+# only these four angles, near-upright first since they usually read best;
+# their rotation matrices (about the origin) are fixed
+_ANGLES = (-15, 15, -30, 30)
+# a letter read at least this confidently skips its remaining rotations
+_EARLY_EXIT_CONF = 85.0
+_ROTATION_MATRICES = {ang: cv2.getRotationMatrix2D((0, 0), ang, 1.0) for ang in _ANGLES}
+
+
+# Kernels are compiled eagerly from explicit signatures at import time, and cache=True
+# keeps the machine code on disk for later processes, so the first CAPTCHA of a run
+# doesn't pay JIT compilation while Amazon's CAPTCHA session is waiting
+_DARK_THRESHOLD = np.uint8(32)  # uint8 keeps the per-pixel compare in uint8
+_MIN_LETTER_WIDTH = 5
+# any-layout 2-D uint8 view; readonly also accepts writable arrays (PIL buffers are readonly)
+_GRAY = types.Array(types.uint8, 2, 'A', readonly=True)
+
+
+@njit(types.UniTuple(types.int64, 4)(_GRAY), cache=True)
+def _trim_bounds(gray):
+    """
+    Bounding box (top, bottom, left, right) of the non-white (< 255) pixels of a
+    uint8 grayscale array, in one pass; the full frame if every pixel is white.
+    """
+    height, width = gray.shape
+    top, bottom, left, right = height, 0, width, 0
+    for y in range(height):
+        for x in range(width):
+            if gray[y, x] < 255:
+                top = min(top, y)
+                bottom = max(bottom, y + 1)
+                left = min(left, x)
+                right = max(right, x + 1)
+
+    if bottom == 0:
+        return 0, height, 0, width
+    return top, bottom, left, right
+
+
+@njit(types.int32[:, :](_GRAY, types.uint8, types.int64), cache=True)
+def _segments(arr, thresh, min_w):
+    """
+    Vertical-projection segmentation of a uint8 grayscale array.
+    Returns an int32 (n, 2) array of [start, end) column bounds for every run
+    of columns containing dark (< thresh) pixels that is at least `min_w` wide.
+    """
+    height, width = arr.shape
+    counts = np.zeros(width, dtype=np.int32)
+    for y in range(height):
+        for x in range(width):
+            if arr[y, x] < thresh:
+                counts[x] += 1
+
+    bounds = np.empty((width // max(min_w, 1) + 1, 2), dtype=np.int32)
+    n, start = 0, -1
+    for x in range(width):
+        if counts[x] > 0 and start < 0:
+            start = x
+        elif counts[x] == 0 and start >= 0:
+            if x - start >= min_w:
+                bounds[n, 0], bounds[n, 1] = start, x
+                n += 1
+            start = -1
+
+    if start >= 0 and width - start >= min_w:
+        bounds[n, 0], bounds[n, 1] = start, width
+        n += 1
+    return bounds[:n]
+
+
+def _rotation_canvas(arr):
+    """
+    Square canvas whose side is the diagonal of `arr`, large enough to hold it rotated
+    by any angle; allocated once per letter and reused for every angle in `_ANGLES`.
+    """
+    side = int(np.ceil(np.hypot(*arr.shape[:2])))
+    return np.full((side, side), 255, dtype=np.uint8)
+
+
+def _rotate(arr, ang, canvas):
+    """
+    Rotate a grayscale uint8 array counter-clockwise by one of the fixed `_ANGLES`
+    into `canvas`, centred and padded with white. Returns `canvas`.
+    """
+    h, w = arr.shape[:2]
+    side_h, side_w = canvas.shape[:2]
+    M = _ROTATION_MATRICES[ang].copy()
+    # translate so the image centre lands on the centre of the canvas
+    M[:, 2] = (side_w / 2, side_h / 2) - M[:, :2] @ (w / 2, h / 2)
+    # BORDER_CONSTANT writes every canvas pixel, so nothing from the previous angle survives
+    return cv2.warpAffine(
+        arr, M, (side_w, side_h), dst=canvas,
+        flags=cv2.INTER_NEAREST, borderMode=cv2.BORDER_CONSTANT, borderValue=255
+    )
+
+
+def _tess_api():
+    api = getattr(_tess_local, "api", None)
+    if api is None:
+        # PSM 10 (single character), default OCR engine
+        api = PyTessBaseAPI(psm=PSM.SINGLE_CHAR, oem=OEM.DEFAULT)
+        _tess_local.api = api
+    return api
+
+
+def _ocr_letter(part, whitelist):
+    """
+    OCR one letter rotated through `_ANGLES` with this thread's Tesseract instance and
+    return the highest-confidence char, stopping once one reaches `_EARLY_EXIT_CONF`.
+    """
+    api = _tess_api()
+    api.SetVariable("tessedit_char_whitelist", whitelist)
+
+    canvas = _rotation_canvas(part)
+
+    best_char, best_conf = "", -1.0
+    for ang in _ANGLES:
+        # rotate and pad with white
+        rot = _rotate(part, ang, canvas)
+        h, w = rot.shape
+        api.SetImageBytes(rot.tobytes(), w, h, 1, w)
+        words = api.GetUTF8Text().split()
+        if not words:
+            continue
+
+        # only consider the first detected character
+        conf = float(api.MeanTextConf())
+        if conf > best_conf:
+            best_conf, best_char = conf, words[0]
+        if best_conf >= _EARLY_EXIT_CONF:
+            break
+
+    return best_char
+
 
 class ImageTextExtractor:
     def __init__(self, image_path):
@@ -13,92 +164,39 @@ class ImageTextExtractor:
             return ""
 
         try:
-            image = Image.open(self.image_path).convert('RGB')
-            image = self._trim_whitespace(image)
+            # one canonical grayscale buffer from here on; stages below pass views of it
+            gray = np.asarray(Image.open(self.image_path).convert('L'))
+            gray = self._trim_whitespace(gray)
         except Exception as e:
             print(f"Failed to open image: {str(e)}")
             return ""
 
-        parts = self._segment_letters_by_projection(image)
-
-        extracted_text = []
-        for idx, part in enumerate(parts):
-            print(f"Processing part {idx+1}")
-            ch = self._recognize_with_rotations(part)
-            extracted_text.append(ch)
-
-        return "".join(extracted_text).replace(' ', '').strip()
-
-    def _trim_whitespace(self, image):
-        img_array = np.asarray(image)
-        is_white = np.all(img_array == [255,255,255], axis=-1)
-        rows = np.where(~np.all(is_white, axis=1))[0]
-        cols = np.where(~np.all(is_white, axis=0))[0]
-        if rows.size == 0 or cols.size == 0:
-            return image
-        top, bottom = rows[0], rows[-1]+1
-        left, right   = cols[0], cols[-1]+1
-        return image.crop((left, top, right, bottom))
-
-    def _segment_letters_by_projection(self, image):
-        gray = image.convert('L')
-        arr = np.array(gray)
-        binary = np.where(arr < 32, 0, 255)
-        vsum = np.sum(binary==0, axis=0)
-
-        parts, start = [], None
-        for x, count in enumerate(vsum):
-            if count>0 and start is None:
-                start = x
-            elif count==0 and start is not None:
-                if x-start >= 5:
-                    parts.append(image.crop((start,0,x,image.height)))
-                start = None
-
-        if start is not None and (len(vsum)-start)>=5:
-            parts.append(image.crop((start,0,len(vsum),image.height)))
+        parts = self._segment_letters_by_projection(gray)
+
+        extracted_text = self._recognize_with_rotations(parts)
+
+        return _WHITESPACE.sub('', "".join(extracted_text))
+
+    def _trim_whitespace(self, gray):
+        top, bottom, left, right = _trim_bounds(gray)
+        return gray[top:bottom, left:right]
+
+    def _segment_letters_by_projection(self, gray):
+        bounds = _segments(gray, _DARK_THRESHOLD, _MIN_LETTER_WIDTH)
+        parts = [gray[:, start:end] for start, end in bounds]
 
         print(f"Segmented into {len(parts)} letter parts")
         return parts
 
     def _recognize_with_rotations(
         self,
-        image: Image.Image,
+        parts: list[np.ndarray],
         whitelist: str = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
-    ) -> str:
+    ) -> list[str]:
         """
-        Rotate `image` through the specific angles [-30, -15, 15, 30],
-        OCR each with Tesseract (PSM 10, uppercase only), and return the highest‐confidence char.
+        Rotate every letter in `parts` through the specific angles [-15, 15, -30, 30],
+        OCR them in-process with letters running concurrently (PSM 10, uppercase only),
+        and return the highest‐confidence char for each letter.
         """
-        best_char, best_conf = "", -1.0
-
-        # only these four angles
-        angles = [-30, -15, 15, 30]
-
-        tconfig = f"-c tessedit_char_whitelist={whitelist} --psm 10 --oem 3"
-
-        for ang in angles:
-            # rotate and pad with white
-            rot = image.rotate(ang, expand=True, fillcolor=(255,255,255))
-            data = pytesseract.image_to_data(
-                rot, config=tconfig, output_type=pytesseract.Output.DICT
-            )
-
-            # scan until we find a non‐empty text result
-            for txt, conf in zip(data["text"], data["conf"]):
-                txt = txt.strip()
-                if not txt:
-                    continue
-                try:
-                    c_conf = float(conf)
-                except Exception:
-                    continue
-
-                if c_conf > best_conf:
-                    best_conf, best_char = c_conf, txt
-                break  # only consider the first detected character
-
-        return best_char
-
-
-
+        print(f"Recognizing {len(parts)} letter parts")
+        return list(_OCR_POOL.map(partial(_ocr_letter, whitelist=whitelist), parts))
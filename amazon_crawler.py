@@ -6,19 +6,16 @@ from selenium.webdriver.support import expected_conditions as EC
 import json
 import time
 
-#with open("product_links.json", "w") as f:
-    #json.dump([], f)
-
-def write_json(new_data, filename='product_links.json'):
-    with open(filename,'r+') as file:
-          # First we load existing data into a dict.
-        file_data = json.load(file)
-        # Join new_data with file_data inside emp_details
-        file_data.append(new_data)
-        # Sets file's current position at offset.
-        file.seek(0)
-        # convert back to json.
-        json.dump(file_data, file, indent = 4)
+#with open("product_links.jsonl", "w") as f:
+    #pass
+
+# One JSON object per line, appended as links are found (no re-read of the file)
+link_file = open("product_links.jsonl", "a", encoding="utf-8")
+
+def write_jsonl(new_data, file=link_file):
+    file.write(json.dumps(new_data) + "\n")
+    # Flush so links survive a crash mid-crawl
+    file.flush()
 
 options = uc.ChromeOptions()
 options.add_argument("--disable-blink-features=AutomationControlled")
@@ -51,7 +48,7 @@ while not isNextDisabled:
                 By.CLASS_NAME, 'a-link-normal').get_attribute('href')
             print("Link: " + link + "\n")
 
-            write_json({
+            write_jsonl({
                 "link": link
             })
 
@@ -69,3 +66,5 @@ while not isNextDisabled:
     except Exception as e:
         print(e, "Main Error")
         isNextDisabled = True
+
+link_file.close()
@@ -6,6 +6,7 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 import json
+import re
 import time
 import random
 import os
@@ -64,6 +65,9 @@ def _setup_chrome_options(proxy=None):
         options.add_argument(f'--proxy-server={proxy}')
     return options
 
+# Anything that can't be part of a CAPTCHA answer
+_NONALNUM = re.compile(r'[^A-Za-z0-9]+')
+
 # Improved CAPTCHA Solver with retries
 def _solve_captcha(browser, wait, max_attempts=5):
     for attempt in range(1, max_attempts + 1):
@@ -92,7 +96,7 @@ def _solve_captcha(browser, wait, max_attempts=5):
 
             # Extract text from CAPTCHA
             extractor = ImageTextExtractor(captcha_path)
-            captcha_text = ''.join(char for char in extractor.extract_text() if char.isalnum())
+            captcha_text = _NONALNUM.sub('', extractor.extract_text())
             
             if not captcha_text:
                 logger.warning(f"Failed to extract text from CAPTCHA (attempt {attempt})")
@@ -139,48 +143,68 @@ def _solve_captcha(browser, wait, max_attempts=5):
     
     return False
 
+# Evaluates every CSS selector inside the page and returns {key: first non-empty value},
+# so a product page costs one WebDriver round-trip instead of one per selector
+_EXTRACT_JS = """
+const extractors = arguments[0];
+const out = {};
+for (const [key, selectorList] of Object.entries(extractors)) {
+    for (const [selector, attr] of selectorList) {
+        let el = null;
+        try {
+            el = document.querySelector(selector);
+        } catch (e) {
+            continue;
+        }
+        if (!el) continue;
+        const value = attr === 'src' ? el.src : el.innerText.trim();
+        if (value) {
+            out[key] = value;
+            break;
+        }
+    }
+}
+return out;
+"""
+
 # Data Extractor
-def _extract_product_data(browser, wait, element, url):
+def _extract_product_data(browser, element, url):
     """Extract product data from the Amazon page"""
     data = {}
+    # CSS only: the browser's native selector engine is much cheaper than XPath
+    # (XPath positional steps like div[1] map to :nth-of-type(1))
     extractors = {
-        'name': [(By.CSS_SELECTOR, 'span#productTitle', 'text')],
+        'name': [('span#productTitle', 'text')],
         'price': [
-            (By.XPATH, '//*[@id="corePriceDisplay_desktop_feature_div"]/div[1]/span[2]/span[2]', 'text'),
-            (By.CSS_SELECTOR, 'span.a-price span.a-offscreen', 'text'),
-            (By.CSS_SELECTOR, 'span.a-price', 'text')
+            ('#corePriceDisplay_desktop_feature_div > div:nth-of-type(1) > span:nth-of-type(2) > span:nth-of-type(2)', 'text'),
+            ('span.a-price span.a-offscreen', 'text'),
+            ('span.a-price', 'text')
         ],
         'rating': [
-            (By.XPATH, '//*[@id="cm_cr_dp_d_rating_histogram"]/div[2]/div/div[2]/div/span/span', 'text'),
-            (By.CSS_SELECTOR, 'span.a-icon-alt', 'text'),
-            (By.CSS_SELECTOR, 'div.a-row a-spacing-small > span', 'text')
+            ('#cm_cr_dp_d_rating_histogram > div:nth-of-type(2) > div > div:nth-of-type(2) > div > span > span', 'text'),
+            ('span.a-icon-alt', 'text'),
+            ('div.a-row a-spacing-small > span', 'text')
         ],
-        'image': [(By.CSS_SELECTOR, 'img#landingImage', 'src')],
-        'characteristics': [(By.XPATH, '//*[@id="poExpander"]/div[1]/div/table/tbody', 'text')],
+        'image': [('img#landingImage', 'src')],
+        'characteristics': [('#poExpander > div:nth-of-type(1) > div > table > tbody', 'text')],
         'about_this_item': [
-            (By.XPATH, '//*[@id="feature-bullets"]/ul', 'text'),
-            (By.CSS_SELECTOR, 'div#feature-bullets ul', 'text')
+            ('#feature-bullets > ul', 'text'),
+            ('div#feature-bullets ul', 'text')
         ],
-        'technical_details': [(By.XPATH, '//*[@id="productDetails_techSpec_section_1"]/tbody', 'text')],
+        'technical_details': [('#productDetails_techSpec_section_1 > tbody', 'text')],
         'product_description': [
-            (By.XPATH, '//*[@id="productDescription"]/p/span', 'text'),
-            (By.CSS_SELECTOR, 'div#productDescription p', 'text')
+            ('#productDescription > p > span', 'text'),
+            ('div#productDescription p', 'text')
         ],
-        'additional_information': [(By.XPATH, '//*[@id="productDetails_db_sections"]', 'text')],
-        'warranty': [(By.XPATH, '//*[@id="productSpecifications_dp_warranty_and_support"]/div/div[1]/span[3]', 'text')],
-        'compare_with_similar_items':[(By.XPATH,'//div[@class="_product-comparison-desktop_desktopFaceoutStyle_comparison-table-wrapper__1UCJ-"]','text')]
+        'additional_information': [('#productDetails_db_sections', 'text')],
+        'warranty': [('#productSpecifications_dp_warranty_and_support > div > div:nth-of-type(1) > span:nth-of-type(3)', 'text')],
+        'compare_with_similar_items': [('div[class="_product-comparison-desktop_desktopFaceoutStyle_comparison-table-wrapper__1UCJ-"]', 'text')]
     }
 
-    for key, selector_list in extractors.items():
-        value = "N/A"
-        for by, selector, attr in selector_list:
-            try:
-                found_element = browser.find_element(by, selector)
-                value = found_element.get_attribute('src') if attr == 'src' else found_element.text
-                if value:
-                    break
-            except NoSuchElementException:
-                continue
+    found = browser.execute_script(_EXTRACT_JS, extractors) or {}
+
+    for key in extractors:
+        value = found.get(key) or "N/A"
 
         if key == 'name' and value != "N/A":
             parts = value.split("\"", 1)
@@ -192,6 +216,16 @@ def _extract_product_data(browser, wait, element, url):
     data['url'] = url
     return data
 
+# Browser Teardown
+def _quit_browser(browser):
+    """Quit `browser` if it is running; always returns None for reassignment."""
+    if browser:
+        try:
+            browser.quit()
+        except Exception as e:
+            logger.warning(f"Error while closing browser: {e}")
+    return None
+
 # JSON Writer
 def _write_json(data_list, filename='amazon_data.json'):
     try:
@@ -200,95 +234,155 @@ def _write_json(data_list, filename='amazon_data.json'):
     except Exception as e:
         logger.error(f"JSON write error: {e}")
 
+# JSON Lines Reader / Writer (one product per line, appended as it is scraped)
+def _read_jsonl(filename='amazon_data.jsonl'):
+    if not os.path.exists(filename):
+        return
+    with open(filename, 'r', encoding='utf-8') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by a crash mid-write
+                logger.warning(f"Skipping malformed line in {filename}")
+
+def _open_jsonl_for_append(filename='amazon_data.jsonl'):
+    # A crash mid-write leaves a last line without its newline; start a fresh line
+    # so the next record isn't glued onto it
+    needs_newline = False
+    if os.path.exists(filename) and os.path.getsize(filename):
+        with open(filename, 'rb') as file:
+            file.seek(-1, os.SEEK_END)
+            needs_newline = file.read(1) != b"\n"
+    file = open(filename, 'a', encoding='utf-8')
+    if needs_newline:
+        file.write("\n")
+    return file
+
+def _append_jsonl(file, data):
+    file.write(json.dumps(data, ensure_ascii=False) + "\n")
+    file.flush()
+    os.fsync(file.fileno())
+
 # Main Scraper
 def main():
     proxy_manager = ProxyManager(rotation_minutes=2)
-    scraped_products = []
     os.makedirs('captchas', exist_ok=True)
 
-    try:
-        with open('amazon_data.json', 'r', encoding='utf-8') as f:
-            scraped_products = json.load(f)
-    except:
-        pass
+    # Seed the JSON-lines log from a previous run's amazon_data.json so the final
+    # compaction doesn't drop products scraped before the log existed
+    if not os.path.exists('amazon_data.jsonl') and os.path.exists('amazon_data.json'):
+        try:
+            with open('amazon_data.json', 'r', encoding='utf-8') as f:
+                previous_products = json.load(f)
+            with open('amazon_data.jsonl.tmp', 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(product, ensure_ascii=False) + "\n" for product in previous_products)
+            os.replace('amazon_data.jsonl.tmp', 'amazon_data.jsonl')
+        except Exception as e:
+            logger.error(f"Could not import amazon_data.json: {e}")
 
-    with open('product_links.json', 'r', encoding='utf-8') as f:
-        urls_to_scrape = [item['link'] for item in json.load(f) if isinstance(item, dict) and 'link' in item]
+    with open('product_links.jsonl', 'r', encoding='utf-8') as f:
+        links = [json.loads(line) for line in f if line.strip()]
+    # dict.fromkeys drops links the crawler recorded more than once, keeping crawl order
+    urls_to_scrape = list(dict.fromkeys(item['link'] for item in links if isinstance(item, dict) and 'link' in item))
 
-    scraped_urls = {item['url'] for item in scraped_products}
+    scraped_urls = frozenset(item['url'] for item in _read_jsonl() if 'url' in item)
     urls_to_scrape = [url for url in urls_to_scrape if url not in scraped_urls]
 
-    for i, url in enumerate(urls_to_scrape):
-        if terminate:
-            break
-
-        logger.info(f"Scraping ({i+1}/{len(urls_to_scrape)}): {url}")
-        proxy = proxy_manager.get_proxy_for_selenium()
-        options = _setup_chrome_options(proxy)
-        browser = None
-        captcha_solved = False
-        page_loaded = False
-        max_page_load_attempts = 3
+    browser = None
+    proxy = None
+    with _open_jsonl_for_append() as scraped_file:
+        for i, url in enumerate(urls_to_scrape):
+            if terminate:
+                break
+
+            logger.info(f"Scraping ({i+1}/{len(urls_to_scrape)}): {url}")
+
+            # Keep one browser per proxy-rotation window; only relaunch Chrome when the proxy rotates
+            if browser is None or (len(proxy_manager) and proxy_manager.should_rotate_proxy()):
+                browser = _quit_browser(browser)
+                proxy = proxy_manager.get_proxy_for_selenium()
+            else:
+                try:
+                    # Avoid session bleed between products
+                    browser.delete_all_cookies()
+                except Exception as e:
+                    logger.warning(f"Could not reset browser session, relaunching: {e}")
+                    browser = _quit_browser(browser)
+
+            captcha_solved = False
+            page_loaded = False
+            max_page_load_attempts = 3
         
-        for attempt in range(1, max_page_load_attempts + 1):
-            try:
-                if browser:
-                    browser.quit()
-                    
-                logger.info(f"Page load attempt {attempt}/{max_page_load_attempts}")
-                browser = uc.Chrome(options=options)
-                wait = WebDriverWait(browser, 15)
-                browser.get(url)
-                
-                wait.until(lambda d: d.execute_script("return document.readyState") == "complete")
-                page_loaded = True
+            for attempt in range(1, max_page_load_attempts + 1):
+                try:
+                    if attempt > 1:
+                        # Retry with a fresh session on the same proxy
+                        browser = _quit_browser(browser)
+
+                    if browser is None:
+                        logger.info(f"Starting new browser session (proxy: {proxy})")
+                        browser = uc.Chrome(options=_setup_chrome_options(proxy))
+                        wait = WebDriverWait(browser, 15)
+
+                    logger.info(f"Page load attempt {attempt}/{max_page_load_attempts}")
+                    browser.get(url)
                 
-                # Try to solve CAPTCHA (if present)
-                captcha_solved = _solve_captcha(browser, wait, max_attempts=5)
-                if not captcha_solved:
-                    logger.warning(f"Failed to solve CAPTCHA on attempt {attempt}, trying with a new session")
-                    continue
+                    wait.until(lambda d: d.execute_script("return document.readyState") == "complete")
+                    page_loaded = True
                 
-                # Now try to find the product container
-                product_container_found = False
-                for selector in ['div#ppd', 'div#dp-container', 'div#centerCol']:
-                    try:
-                        element = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, selector)))
-                        product_container_found = True
-                        break
-                    except TimeoutException:
+                    # Try to solve CAPTCHA (if present)
+                    captcha_solved = _solve_captcha(browser, wait, max_attempts=5)
+                    if not captcha_solved:
+                        logger.warning(f"Failed to solve CAPTCHA on attempt {attempt}, trying with a new session")
                         continue
                 
-                if not product_container_found:
-                    logger.warning(f"Product container not found on attempt {attempt}")
-                    continue
+                    # Now try to find the product container
+                    product_container_found = False
+                    for selector in ['div#ppd', 'div#dp-container', 'div#centerCol']:
+                        try:
+                            element = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, selector)))
+                            product_container_found = True
+                            break
+                        except TimeoutException:
+                            continue
+                
+                    if not product_container_found:
+                        logger.warning(f"Product container not found on attempt {attempt}")
+                        continue
                     
-                # Add some random scrolling to appear more human-like
-                browser.execute_script(f"window.scrollTo(0, {random.randint(300, 700)});")
-                time.sleep(random.uniform(1, 2))
-
-                # Extract product data
-                product_data = _extract_product_data(browser, wait, element, url)
-                if product_data.get('name') != 'N/A':
-                    scraped_products.append(product_data)
-                    _write_json(scraped_products)
-                    logger.info(f"Successfully scraped: {product_data['name']}")
-                    break  # Success - exit the retry loop
-                else:
-                    logger.warning(f"No product name found on attempt {attempt}")
+                    # Add some random scrolling to appear more human-like
+                    browser.execute_script(f"window.scrollTo(0, {random.randint(300, 700)});")
+                    time.sleep(random.uniform(1, 2))
+
+                    # Extract product data
+                    product_data = _extract_product_data(browser, element, url)
+                    if product_data.get('name') != 'N/A':
+                        _append_jsonl(scraped_file, product_data)
+                        logger.info(f"Successfully scraped: {product_data['name']}")
+                        break  # Success - exit the retry loop
+                    else:
+                        logger.warning(f"No product name found on attempt {attempt}")
                     
-            except Exception as e:
-                logger.error(f"Error on attempt {attempt} for {url}: {e}")
-                if attempt == max_page_load_attempts:
-                    logger.error(f"Failed to scrape {url} after {max_page_load_attempts} attempts")
-            
-        if browser:
-            browser.quit()
+                except Exception as e:
+                    logger.error(f"Error on attempt {attempt} for {url}: {e}")
+            else:
+                # Every attempt failed (error, CAPTCHA, missing container or name): don't
+                # carry a possibly broken session over to the next product
+                logger.error(f"Failed to scrape {url} after {max_page_load_attempts} attempts")
+                browser = _quit_browser(browser)
+
+            # Delay between products
+            delay = random.uniform(5, 10)
+            logger.info(f"Waiting {delay:.2f} seconds before next product...")
+            time.sleep(delay)
+
+    _quit_browser(browser)
 
-        # Delay between products
-        delay = random.uniform(5, 10)
-        logger.info(f"Waiting {delay:.2f} seconds before next product...")
-        time.sleep(delay)
+    # Compact the JSON-lines log into the JSON array the rest of the pipeline reads
+    _write_json(list(_read_jsonl()))
 
 if __name__ == "__main__":
     main()
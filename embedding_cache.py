@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import threading
+import hashlib
+import numpy as np
+from typing import List, Optional
+
+# stay well under SQLite's limit on bound parameters per statement
+_MAX_SQL_PARAMS = 500
+
+
+def text_hash(model: str, text: str) -> str:
+    """SHA-256 of the model name and text, so a model change never reuses stale entries."""
+    return hashlib.sha256(f"{model}:{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """On-disk cache of embedding vectors and LLM summaries, keyed by SHA-256 of their input."""
+
+    def __init__(self, path: str):
+        """
+        Open (or create) the SQLite cache file.
+
+        Args:
+            path: Location of the SQLite file; its directory is created if missing
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # one connection shared by every thread (e.g. Streamlit sessions), serialized by the lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (hash TEXT PRIMARY KEY, model TEXT, vector BLOB)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS summaries (hash TEXT PRIMARY KEY, model TEXT, summary TEXT)"
+        )
+        self.conn.commit()
+
+    def get_vectors(self, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Cached float32 vector for each text, or None where the text has not been embedded yet."""
+        hashes = [text_hash(model, text) for text in texts]
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        for i in range(0, len(unique), _MAX_SQL_PARAMS):
+            chunk = unique[i:i + _MAX_SQL_PARAMS]
+            with self.lock:
+                rows = self.conn.execute(
+                    f"SELECT hash, vector FROM cache WHERE hash IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+            for h, blob in rows:
+                found[h] = np.frombuffer(blob, dtype=np.float32)
+        return [found.get(h) for h in hashes]
+
+    def put_vectors(self, model: str, texts: List[str], vectors: List[List[float]]):
+        """Store freshly computed vectors for `texts`."""
+        rows = [
+            (text_hash(model, text), model, np.asarray(vector, dtype=np.float32).tobytes())
+            for text, vector in zip(texts, vectors)
+        ]
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO cache (hash, model, vector) VALUES (?, ?, ?)", rows
+            )
+            self.conn.commit()
+
+    def get_summary(self, model: str, prompt_text: str) -> Optional[str]:
+        """Cached summary generated from `prompt_text`, or None."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT summary FROM summaries WHERE hash = ?", (text_hash(model, prompt_text),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_summary(self, model: str, prompt_text: str, summary: str):
+        """Store a summary generated from `prompt_text`."""
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO summaries (hash, model, summary) VALUES (?, ?, ?)",
+                (text_hash(model, prompt_text), model, summary),
+            )
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
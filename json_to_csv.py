@@ -1,4 +1,7 @@
+import codecs
+import csv
 import json
+import ijson
 import pandas as pd
 
 def json_to_csv_pandas(json_file_path, csv_file_path):
@@ -13,28 +16,38 @@ def json_to_csv_pandas(json_file_path, csv_file_path):
     df.to_csv(csv_file_path, index=False, encoding='utf-8')
     print(f"CSV file created at: {csv_file_path}")
 
-# Si vous avez un fichier très volumineux, cette méthode peut être plus robuste
-def json_to_csv_pandas_safe(json_file_path, csv_file_path):
+def _iter_records(file):
+    """Itérer sur les enregistrements JSON sans charger tout le fichier en mémoire"""
+    # Ignorer un éventuel BOM UTF-8
+    if file.read(3) != codecs.BOM_UTF8:
+        file.seek(0)
+    start = file.tell()
+
+    # Un objet unique à la racine donne une seule ligne, comme pd.DataFrame([data])
+    first = file.read(1)
+    while first.isspace():
+        first = file.read(1)
+    file.seek(start)
+
+    return ijson.items(file, '' if first == b'{' else 'item', use_float=True)
+
+# Pour les fichiers très volumineux : lecture en flux avec ijson, écriture ligne par ligne
+def json_to_csv_streaming(json_file_path, csv_file_path):
     try:
-        # Essayer avec différents encodages
-        encodings = ['utf-8', 'utf-16', 'latin-1', 'ISO-8859-1']
-        
-        for encoding in encodings:
-            try:
-                with open(json_file_path, 'r', encoding=encoding) as file:
-                    data = json.load(file)
-                    
-                # Convert to DataFrame
-                df = pd.DataFrame([data]) if isinstance(data, dict) else pd.DataFrame(data)
-                
-                # Write to CSV
-                df.to_csv(csv_file_path, index=False, encoding='utf-8')
-                print(f"CSV file created with encoding {encoding} at: {csv_file_path}")
-                return
-            except UnicodeDecodeError:
-                continue
-            
-        print("Impossible de décoder le fichier avec les encodages essayés.")
+        # Premier passage : collecter les colonnes dans l'ordre d'apparition (comme pandas)
+        fieldnames = {}
+        with open(json_file_path, 'rb') as file:
+            for record in _iter_records(file):
+                fieldnames.update(dict.fromkeys(record))
+
+        # Second passage : écrire chaque enregistrement directement dans le CSV
+        with open(json_file_path, 'rb') as file, \
+                open(csv_file_path, 'w', newline='', encoding='utf-8') as out:
+            writer = csv.DictWriter(out, fieldnames=list(fieldnames), restval='', lineterminator='\n')
+            writer.writeheader()
+            writer.writerows(_iter_records(file))
+
+        print(f"CSV file created at: {csv_file_path}")
     except Exception as e:
         print(f"Erreur: {e}")
 
@@ -42,5 +55,5 @@ def json_to_csv_pandas_safe(json_file_path, csv_file_path):
 json_file = "amazon_data.json"
 csv_file = "amazon_raw_data.csv"
 
-# Utilisez cette version améliorée
-json_to_csv_pandas_safe(json_file, csv_file)
+# Utilisez cette version en flux
+json_to_csv_streaming(json_file, csv_file)
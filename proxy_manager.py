@@ -151,9 +151,11 @@ class ProxyManager:
             # Still no proxies available
             return None
             
-        # Get a random proxy from available ones
-        proxy = random.choice(self.available_proxies)
-        self.available_proxies.remove(proxy)
+        # Get a random proxy from available ones (swap with the last one and pop: O(1))
+        i = random.randrange(len(self.available_proxies))
+        proxy = self.available_proxies[i]
+        self.available_proxies[i] = self.available_proxies[-1]
+        self.available_proxies.pop()
         self.used_proxies.add(proxy)
         
         # Update tracking
@@ -1,20 +1,36 @@
 import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 import os
+import math
+import time
+import threading
+import asyncio
+import random
 import lancedb
+import httpx
+from numba import njit, prange, types
 from tqdm import tqdm
-from langchain_core.documents import Document
 from langchain_community.vectorstores import LanceDB 
 from langchain_cohere import CohereEmbeddings
 from langchain_groq import ChatGroq
+import groq
+from langchain_core.documents import Document
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
 from langchain.retrievers.multi_vector import MultiVectorRetriever
 from langchain.storage import InMemoryStore
 import json
 import uuid
+import pickle
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
 from typing import List
+from cachetools import TTLCache
 import streamlit as st
+from embedding_cache import EmbeddingCache
 
 # Initialize Cohere API for embeddings
 cohere_api_key = os.getenv("COHERE_API_KEY")
@@ -28,105 +44,282 @@ if not groq_api_key:
     groq_api_key = input("Enter your Groq API key: ")
     os.environ["GROQ_API_KEY"] = groq_api_key
 
+# Streamlit re-runs this whole script on every widget interaction: clients, the data and the
+# retriever below are created once per process through st.cache_resource / st.cache_data
+
+# set_page_config has to be the first Streamlit call, ahead of the cached getters' spinners
+st.set_page_config(page_title=" Product Recommender", layout="wide")
+
 # Set up Groq LLM
-groq_llm = ChatGroq(
-    api_key=groq_api_key,
-    model_name="meta-llama/llama-4-scout-17b-16e-instruct",
-)
+@st.cache_resource
+def get_llm() -> ChatGroq:
+    return ChatGroq(
+        api_key=groq_api_key,
+        model_name="meta-llama/llama-4-scout-17b-16e-instruct",
+    )
+
+groq_llm = get_llm()
 
-try:
-    df = pd.read_csv("amazon_scraping_data.csv")
+@st.cache_data
+def load_df() -> pd.DataFrame:
+    # Arrow's multithreaded CSV reader, parsing only the used columns into Arrow-backed
+    # dtypes; called directly because pandas' engine="pyarrow" can't read quoted values
+    # spanning several lines, which the scraped descriptions contain
+    try:
+        table = pa_csv.read_csv(
+            "amazon_scraping_data.csv",
+            parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=used_columns,
+                include_missing_columns=True
+            )
+        )
+    except FileNotFoundError:
+        raise FileNotFoundError("amazon_scraping_data.csv not found. Please check the file path.")
+    df = table.to_pandas(types_mapper=pd.ArrowDtype)
     print(df.head())
-except FileNotFoundError:
-    raise FileNotFoundError("amazon_scraping_data.csv not found. Please check the file path.")
+    return df
 
 # Columns you want to embed separately for multi-vector approach
 columns_to_embed = ["title", "characteristics", "about_this_item", "technical_details", 
                    "product_description", "additional_information", "compare_with_similar_items", "warranty"]
 
-# Initialize Cohere embeddings
-embeddings = CohereEmbeddings(
-    cohere_api_key=cohere_api_key,
-    model="embed-v4.0"
-)
+# Query embeddings are reused for a while, so a repeated question doesn't hit the API again
+_query_embedding_cache = TTLCache(maxsize=1024, ttl=600)
+_query_embedding_lock = threading.RLock()
+
+class CachedCohereEmbeddings(CohereEmbeddings):
+    """CohereEmbeddings that caches embed_query results in an in-process TTL cache."""
+    
+    def embed_query(self, text: str) -> List[float]:
+        key = (embedding_model_key, text)
+        with _query_embedding_lock:
+            vector = _query_embedding_cache.get(key)
+        if vector is None:
+            vector = super().embed_query(text)
+            with _query_embedding_lock:
+                _query_embedding_cache[key] = vector
+        return vector
+
+# Initialize Cohere embeddings; int8 vectors are a quarter the size of float32 ones
+# and keep nearly all of the retrieval quality
+@st.cache_resource
+def get_embeddings() -> CachedCohereEmbeddings:
+    return CachedCohereEmbeddings(
+        cohere_api_key=cohere_api_key,
+        model="embed-v4.0",
+        embedding_types=["int8"]
+    )
+
+embeddings = get_embeddings()
+# cache key for stored vectors: the same model with another embedding type gives different vectors
+embedding_model_key = f"{embeddings.model}:{'+'.join(embeddings.embedding_types)}"
 
 # Initialize LanceDB
 db_path = "./PFA/lancedb_data"
-db = lancedb.connect(db_path)
+
+@st.cache_resource
+def get_db():
+    return lancedb.connect(db_path)
+
+db = get_db()
 
 # Set up the LanceDB table for multi-vector storage
 table_name = "amazon_multi_vector_store"
 
-def create_multi_vector_documents(df: pd.DataFrame) -> tuple:
+# Parent documents for the MultiVectorRetriever docstore, saved at ingest time
+parent_store_path = os.path.join(db_path, "parent_store.pkl")
+
+# Embeddings and LLM summaries already computed for the same (model, text) are reused across runs
+@st.cache_resource
+def get_embedding_cache() -> EmbeddingCache:
+    return EmbeddingCache(os.path.join(db_path, "embedding_cache.sqlite"))
+
+embedding_cache = get_embedding_cache()
+
+# Cohere embed accepts up to 96 texts per request; longer texts are split into several rows
+EMBED_BATCH_SIZE = 96
+MAX_EMBED_CHARS = 512_000
+# a few requests in flight at once, retried with backoff when Cohere rate-limits us
+EMBED_WORKERS = 4
+EMBED_MAX_RETRIES = 5
+# ANN index over the child vectors; PQ needs at least 256 rows to train its codebooks
+VECTOR_METRIC = "cosine"
+INDEX_MIN_ROWS = 256
+INDEX_SUB_VECTORS = 32
+# child vectors fetched from the ANN index and re-scored exactly for every query
+RERANK_CANDIDATES = 50
+# concurrent LLM calls (and attempts per product) when generating summaries
+SUMMARY_CONCURRENCY = 10
+SUMMARY_MAX_ATTEMPTS = 4
+# products get an AI summary only with at least this many prompt fields, shorter than this in total
+SUMMARY_MIN_FIELDS = 3
+SUMMARY_MAX_CHARS = 500
+
+def split_for_embedding(docs: List[dict]) -> tuple:
+    """
+    Flatten child document dicts into parallel lists of texts and metadatas for embedding.
+    Texts longer than MAX_EMBED_CHARS are split into chunks sharing the same metadata.
+    """
+    texts = []
+    metadatas = []
+    for doc in docs:
+        text = doc["page_content"]
+        for start in range(0, max(len(text), 1), MAX_EMBED_CHARS):
+            texts.append(text[start:start + MAX_EMBED_CHARS])
+            metadatas.append(doc["metadata"])
+    return texts, metadatas
+
+def is_transient_error(e: Exception) -> bool:
+    """Rate limits (429), server errors (5xx), timeouts and dropped connections."""
+    status = getattr(e, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(e, (httpx.TransportError, TimeoutError, ConnectionError))
+
+def embed_with_retry(batch_texts: List[str]) -> List[List[float]]:
+    """
+    Embed one batch of texts, retrying failed requests with exponential backoff
+    (or the delay given by the API's Retry-After header when there is one).
+    Only transient errors are retried; auth, quota and validation errors fail at once.
+    """
+    # small jitter so the workers don't all hit the API in the same instant
+    time.sleep(random.uniform(0, 0.05))
+    for attempt in range(EMBED_MAX_RETRIES):
+        try:
+            return embeddings.embed_documents(batch_texts)
+        except Exception as e:
+            if attempt == EMBED_MAX_RETRIES - 1 or not is_transient_error(e):
+                raise
+            headers = getattr(e, "headers", None) or {}
+            try:
+                delay = float(headers.get("retry-after") or headers.get("Retry-After"))
+            except (TypeError, ValueError):
+                delay = 2 ** attempt
+            print(f"Embedding request failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay + random.uniform(0, 0.05))
+
+def embedding_table(texts: List[str], metadatas: List[dict], vectors: List[List[float]]) -> pa.Table:
+    """
+    Build an Arrow table with the same layout as LangChain's LanceDB store
+    (vector, id, text, metadata) so the table can be queried through it afterwards.
+    """
+    # one contiguous (N, D) block, handed to Arrow without a per-row copy; int8 values
+    # are exact in float16, which LanceDB can index (it has no int8 vector search)
+    vectors = np.vstack(vectors).astype(np.float16, copy=False)
+    return pa.table({
+        "vector": pa.FixedSizeListArray.from_arrays(pa.array(vectors.ravel()), vectors.shape[1]),
+        "id": pa.array([str(uuid.uuid4()) for _ in texts]),
+        "text": pa.array(texts),
+        # the struct type is the union of all metadata keys (summaries have no field_type)
+        "metadata": pa.array(metadatas),
+    })
+
+# Documents are only built for ingest and the docstore, so they skip LangChain's pydantic
+# Document: child documents are plain dicts written straight into the Arrow table, and
+# parents are this slotted class, turned into Documents only for the few the retriever returns
+@dataclass
+class ParentDoc:
+    __slots__ = ("page_content", "metadata")
+    page_content: str
+    metadata: dict
+
+# Columns copied into every document's metadata
+metadata_columns = ["title", "price", "rating", "url", "image"]
+# every CSV column the documents are built from; nothing else is read
+used_columns = list(dict.fromkeys(metadata_columns + columns_to_embed))
+
+def clean_product_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    String copy of the columns used to build documents: missing values become ""
+    and every value is stripped. Columns absent from the CSV come back empty.
+    """
+    # object first: Arrow-typed columns (e.g. double rating) can't be filled with ""
+    return (
+        df.reindex(columns=used_columns).astype(object).fillna("").astype(str)
+        .apply(lambda s: s.str.strip())
+    )
+
+@st.cache_data
+def load_clean_df() -> pd.DataFrame:
+    """The product CSV cleaned once, shared by the document and summary builders."""
+    return clean_product_frame(load_df())
+
+def product_parent_ids(clean: pd.DataFrame) -> List[str]:
+    """
+    Parent document ID of each product: a hash of its URL (or its row index when it has
+    none), so ingest and later runs always link children to the same parent.
+    """
+    return [
+        hashlib.blake2b((url or str(idx)).encode("utf-8"), digest_size=16).hexdigest()
+        for url, idx in zip(clean["url"], clean.index)
+    ]
+
+def create_multi_vector_documents(clean: pd.DataFrame) -> tuple:
     """
-    Create multiple vector representations for each product.
+    Create multiple vector representations for each product (`clean` comes from clean_product_frame).
     Returns parent documents and child documents for multi-vector retrieval.
     """
+    labels = [f"{col.replace('_', ' ').title()}: " for col in columns_to_embed]
+    
+    doc_ids = product_parent_ids(clean)
     parent_documents = []
     child_documents = []
-    doc_ids = []
     
-    for idx, row in df.iterrows():
-        # Create a unique ID for this parent document
-        parent_id = str(uuid.uuid4())
-        doc_ids.append(parent_id)
-        
-        # Safely convert values to strings
-        def safe_str(value):
-            if pd.isna(value):
-                return ""
-            return str(value).strip()
+    rows = zip(
+        doc_ids,
+        clean.index,
+        clean[metadata_columns].to_dict("records"),
+        clean[columns_to_embed].values.tolist(),
+    )
+    duplicates = 0
+    for parent_id, idx, meta, fields in rows:
+        # "<Field>: <content>" for every non-empty column whose content isn't a repeat
+        # of another field of the same product (e.g. about_this_item == product_description)
+        filled = []
+        seen = set()
+        for col, label, content in zip(columns_to_embed, labels, fields):
+            if not content:
+                continue
+            h = hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+            if h in seen:
+                duplicates += 1
+                continue
+            seen.add(h)
+            filled.append((col, label + content))
         
         # Create parent document with full product information
-        combined_content = []
-        combined_content.append(f"Product: {safe_str(row.get('title', ''))}")
-        combined_content.append(f"Price: {safe_str(row.get('price', ''))}")
-        combined_content.append(f"Rating: {safe_str(row.get('rating', 'N/A'))}")
+        parent_documents.append(ParentDoc(
+            page_content="\n".join([
+                f"Product: {meta['title']}",
+                f"Price: {meta['price']}",
+                f"Rating: {meta['rating']}",
+                *(text for _, text in filled),
+            ]),
+            metadata={"id": parent_id, "original_index": str(idx), **meta, "doc_type": "parent"}
+        ))
         
-        # Add all column content
-        for col in columns_to_embed:
-            content = safe_str(row.get(col, ''))
-            if content:
-                combined_content.append(f"{col.replace('_', ' ').title()}: {content}")
-        
-        parent_doc = Document(
-            page_content="\n".join(combined_content),
-            metadata={
-                "id": parent_id,
-                "original_index": str(idx),
-                "title": safe_str(row.get("title", "")),
-                "price": safe_str(row.get("price", "")),
-                "rating": safe_str(row.get("rating", "")),
-                "url": safe_str(row.get("url", "")),
-                "image": safe_str(row.get("image", "")),
-                "doc_type": "parent"
+        # Create child documents for each important field
+        child_documents.extend(
+            {
+                "page_content": text,
+                "metadata": {
+                    "parent_id": parent_id,
+                    "original_index": str(idx),
+                    **meta,
+                    "field_type": col,
+                    "doc_type": "child"
+                }
             }
+            for col, text in filled
         )
-        parent_documents.append(parent_doc)
-        
-        # Create child documents for each important field
-        for col in columns_to_embed:
-            content = safe_str(row.get(col, ''))
-            if content:
-                child_doc = Document(
-                    page_content=f"{col.replace('_', ' ').title()}: {content}",
-                    metadata={
-                        "parent_id": parent_id,
-                        "original_index": str(idx),
-                        "title": safe_str(row.get("title", "")),
-                        "price": safe_str(row.get("price", "")),
-                        "rating": safe_str(row.get("rating", "")),
-                        "url": safe_str(row.get("url", "")),
-                        "image": safe_str(row.get("image", "")),
-                        "field_type": col,
-                        "doc_type": "child"
-                    }
-                )
-                child_documents.append(child_doc)
+    
+    total = len(child_documents) + duplicates
+    print(f"Dropped {duplicates} duplicate fields out of {total} ({duplicates / max(total, 1):.1%})")
     
     return parent_documents, child_documents, doc_ids
 
-def create_summaries_for_products(df: pd.DataFrame) -> List[Document]:
+def create_summaries_for_products(clean: pd.DataFrame) -> List[dict]:
     """
     Create AI-generated summaries for each product using the LLM.
     These summaries will be used as additional vectors.
@@ -146,190 +339,377 @@ def create_summaries_for_products(df: pd.DataFrame) -> List[Document]:
     """
     
     prompt = ChatPromptTemplate.from_template(summary_template)
-    chain = prompt | groq_llm | StrOutputParser()
-    
-    summary_documents = []
-    
-    def safe_str(value):
-        if pd.isna(value):
-            return ""
-        return str(value).strip()
+    # rate-limited calls are retried with exponential backoff, per product
+    chain = (prompt | groq_llm | StrOutputParser()).with_retry(
+        retry_if_exception_type=(groq.RateLimitError,),
+        wait_exponential_jitter=True,
+        stop_after_attempt=SUMMARY_MAX_ATTEMPTS
+    )
     
-    print("Generating AI summaries for products...")
-    for idx, row in tqdm(df.iterrows(), total=len(df), desc="Creating summaries"):
-        try:
-            summary = chain.invoke({
-                "title": safe_str(row.get("title", "")),
-                "characteristics": safe_str(row.get("characteristics", "")),
-                "about": safe_str(row.get("about_this_item", "")),
-                "technical": safe_str(row.get("technical_details", "")),
-                "description": safe_str(row.get("product_description", ""))
-            })
-            
+    inputs = [
+        {
+            "title": title,
+            "characteristics": characteristics,
+            "about": about,
+            "technical": technical,
+            "description": description
+        }
+        for title, characteristics, about, technical, description in zip(
+            clean["title"], clean["characteristics"], clean["about_this_item"],
+            clean["technical_details"], clean["product_description"]
+        )
+    ]
+    
+    # a summary only adds coverage for sparse products: several short fields; products
+    # with fewer fields or already long ones are covered by their child documents
+    wanted = [
+        i for i, fields in enumerate(inputs)
+        if sum(1 for value in fields.values() if value) >= SUMMARY_MIN_FIELDS
+        and sum(len(value) for value in fields.values()) < SUMMARY_MAX_CHARS
+    ]
+    
+    # only products whose prompt fields changed since the last run go to the LLM
+    prompt_texts = ["\n".join(fields.values()) for fields in inputs]
+    summaries = [None] * len(inputs)
+    for i in wanted:
+        summaries[i] = embedding_cache.get_summary(groq_llm.model_name, prompt_texts[i])
+    pending = [i for i in wanted if summaries[i] is None]
+    
+    print(f"Skipping summaries for {len(inputs) - len(wanted)} of {len(inputs)} products with enough coverage")
+    print(f"Generating AI summaries for {len(pending)} products ({len(wanted) - len(pending)} cached)...")
+    if pending:
+        results = asyncio.run(chain.abatch(
+            [inputs[i] for i in pending],
+            config={"max_concurrency": SUMMARY_CONCURRENCY},
+            return_exceptions=True
+        ))
+        for i, result in zip(pending, results):
+            if isinstance(result, Exception):
+                print(f"Error generating summary for product {clean.index[i]}: {result}")
+                continue
             # Ensure summary is a clean string
-            summary = str(summary).strip()
-            
-            summary_doc = Document(
-                page_content=f"AI Summary: {summary}",
-                metadata={
-                    "parent_id": str(uuid.uuid4()),  # Add parent_id for consistency
-                    "original_index": str(idx),
-                    "title": safe_str(row.get("title", "")),
-                    "price": safe_str(row.get("price", "")),
-                    "rating": safe_str(row.get("rating", "")),
-                    "url": safe_str(row.get("url", "")),
-                    "image": safe_str(row.get("image", "")),
-                    "doc_type": "ai_summary"
-                }
-            )
-            summary_documents.append(summary_doc)
-            
-        except Exception as e:
-            print(f"Error generating summary for product {idx}: {e}")
+            summaries[i] = str(result).strip()
+            embedding_cache.put_summary(groq_llm.model_name, prompt_texts[i], summaries[i])
+    
+    parent_ids = product_parent_ids(clean)
+    meta_rows = clean[metadata_columns].to_dict("records")
+    summary_documents = []
+    for i in wanted:
+        parent_id, idx, meta, summary = parent_ids[i], clean.index[i], meta_rows[i], summaries[i]
+        characteristics = inputs[i]["characteristics"]
+        if summary is not None:
+            page_content = f"AI Summary: {summary}"
+            doc_type = "ai_summary"
+        else:
             # Create a fallback summary
-            title = safe_str(row.get('title', 'Unknown'))
-            characteristics = safe_str(row.get('characteristics', ''))[:100]
-            fallback_summary = f"Product: {title} - {characteristics}"
-            
-            summary_doc = Document(
-                page_content=f"Summary: {fallback_summary}",
-                metadata={
-                    "parent_id": str(uuid.uuid4()),  # Add parent_id for consistency
-                    "original_index": str(idx),
-                    "title": safe_str(row.get("title", "")),
-                    "price": safe_str(row.get("price", "")),
-                    "rating": safe_str(row.get("rating", "")),
-                    "url": safe_str(row.get("url", "")),
-                    "image": safe_str(row.get("image", "")),
-                    "doc_type": "fallback_summary"
-                }
-            )
-            summary_documents.append(summary_doc)
+            page_content = f"Summary: Product: {meta['title']} - {characteristics[:100]}"
+            doc_type = "fallback_summary"
+        
+        summary_documents.append({
+            "page_content": page_content,
+            "metadata": {
+                "parent_id": parent_id,  # links the summary to its product's parent document
+                "original_index": str(idx),
+                **meta,
+                "doc_type": doc_type
+            }
+        })
     
     return summary_documents
 
-# Check if table exists
-table_exists = table_name in db.table_names()
+@st.cache_resource(max_entries=512, show_spinner=False)
+def _cached_retrieve(query_text: str) -> tuple:
+    """Parent documents retrieved for a query; a tuple so the cached result can't be mutated."""
+    return tuple(multi_vector_retriever.invoke(query_text))
 
-if not table_exists:
-    print(f"Creating new multi-vector LanceDB setup '{table_name}'")
-    
-    # Create multi-vector documents
-    parent_docs, child_docs, doc_ids = create_multi_vector_documents(df)
-    
-    # Create AI summaries
-    summary_docs = create_summaries_for_products(df)
-    
-    # Combine all documents for embedding
-    all_child_docs = child_docs + summary_docs
-    
-    print(f"Created {len(parent_docs)} parent documents")
-    print(f"Created {len(child_docs)} child documents")
-    print(f"Created {len(summary_docs)} summary documents")
-    
-    # Create vector store with all child documents
-    print("Creating vector embeddings...")
-    batch_size = 50
-    vector_store = None
-    
-    for i in tqdm(range(0, len(all_child_docs), batch_size), desc="Embedding documents"):
-        batch = all_child_docs[i:i+batch_size]
+def invalidate_query_caches():
+    """Drop cached query embeddings and retrieval results; call whenever the table is rewritten."""
+    _cached_retrieve.clear()
+    with _query_embedding_lock:
+        _query_embedding_cache.clear()
+
+def ensure_vector_index(table):
+    """
+    Build an IVF-PQ index on the vector column so queries don't scan every child vector.
+    Skipped if the table is already indexed or too small to train the PQ codebooks.
+    """
+    if table.list_indices():
+        return
+    num_rows = table.count_rows()
+    if num_rows < INDEX_MIN_ROWS:
+        print(f"Only {num_rows} vectors, skipping ANN index (brute-force search is fine)")
+        return
+    
+    print(f"Building IVF-PQ index over {num_rows} vectors...")
+    table.create_index(
+        metric=VECTOR_METRIC,
+        vector_column_name="vector",
+        num_partitions=int(math.sqrt(num_rows)),
+        num_sub_vectors=INDEX_SUB_VECTORS,
+        index_type="IVF_PQ"
+    )
+
+def has_int8_vectors(table) -> bool:
+    """Whether the table's vectors are int8 embeddings (stored as float16 by embedding_table)."""
+    return table.schema.field("vector").type.value_type == pa.float16()
+
+def save_parent_store(parent_pairs: list):
+    """Write the (parent_id, parent document) pairs next to the LanceDB data."""
+    # plain tuples, so loading the file doesn't depend on where ParentDoc is defined
+    rows = [(doc_id, doc.page_content, doc.metadata) for doc_id, doc in parent_pairs]
+    with open(parent_store_path, "wb") as f:
+        pickle.dump(rows, f, protocol=5)
+
+def load_parent_store():
+    """(parent_id, parent document) pairs saved by the last ingest, or None if there are none."""
+    if not os.path.exists(parent_store_path):
+        return None
+    with open(parent_store_path, "rb") as f:
+        rows = pickle.load(f)
+    return [(doc_id, ParentDoc(page_content, metadata)) for doc_id, page_content, metadata in rows]
+
+def load_or_build_stores(clean: pd.DataFrame) -> tuple:
+    """
+    Open the LanceDB vector store and the parent docstore, running the full ingest
+    (documents, summaries, embeddings, index) first if the table doesn't exist yet
+    or was written before the switch to int8 embeddings.
+    """
+    table_exists = table_name in db.table_names()
+    # tables from before the switch to int8 embeddings hold float32 vectors: int8-scale
+    # queries don't match them and the rerank would cast them to zeros, so they're rebuilt
+    stale_table = table_exists and not has_int8_vectors(db.open_table(table_name))
+
+    if not table_exists or stale_table:
+        if stale_table:
+            print(f"Table '{table_name}' predates the int8 embeddings, rebuilding it")
+        print(f"Creating new multi-vector LanceDB setup '{table_name}'")
         
-        try:
-            if vector_store is None:
-                vector_store = LanceDB.from_documents(
-                    documents=batch,
-                    embedding=embeddings,
-                    connection=db,
-                    table_name=table_name
-                )
-            else:
-                vector_store.add_documents(batch)
-        except Exception as e:
-            print(f"Error processing batch {i//batch_size + 1}: {e}")
-    
-    # Create document store for parent documents
-    docstore = InMemoryStore()
-    docstore.mset(list(zip(doc_ids, parent_docs)))
-    
-    print(f"Multi-vector setup completed!")
+        # Create multi-vector documents
+        parent_docs, child_docs, doc_ids = create_multi_vector_documents(clean)
+        
+        # Create AI summaries
+        summary_docs = create_summaries_for_products(clean)
+        
+        # Combine all documents for embedding
+        all_child_docs = child_docs + summary_docs
+        
+        print(f"Created {len(parent_docs)} parent documents")
+        print(f"Created {len(child_docs)} child documents")
+        print(f"Created {len(summary_docs)} summary documents")
+        
+        # Create vector store with all child documents
+        print("Creating vector embeddings...")
+        texts, metadatas = split_for_embedding(all_child_docs)
+        # only texts missing from the cache go to the API
+        vectors = embedding_cache.get_vectors(embedding_model_key, texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        print(f"{len(texts) - len(missing)} embeddings found in cache, {len(missing)} to compute")
+        # identical texts (shared warranty lines, ...) are embedded once
+        missing_texts = list(dict.fromkeys(texts[i] for i in missing))
+        print(f"{len(missing_texts)} unique texts to embed for {len(missing)} rows")
+        batches = [missing_texts[i:i+EMBED_BATCH_SIZE] for i in range(0, len(missing_texts), EMBED_BATCH_SIZE)]
+        
+        embedded = {}
+        with ThreadPoolExecutor(max_workers=EMBED_WORKERS) as pool:
+            futures = {pool.submit(embed_with_retry, batch): b_idx for b_idx, batch in enumerate(batches)}
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Embedding documents"):
+                b_idx = futures[future]
+                try:
+                    batch_vectors = future.result()
+                except Exception as e:
+                    print(f"Error processing batch {b_idx + 1}: {e}")
+                    continue
+                embedding_cache.put_vectors(embedding_model_key, batches[b_idx], batch_vectors)
+                embedded.update(zip(batches[b_idx], batch_vectors))
+        
+        for i in missing:
+            vectors[i] = embedded.get(texts[i])
+        
+        # keep every row that has a vector, in its original order
+        kept = [i for i, vector in enumerate(vectors) if vector is not None]
+        kept_texts = [texts[i] for i in kept]
+        kept_metadatas = [metadatas[i] for i in kept]
+        vectors = [vectors[i] for i in kept]
+        
+        if not vectors:
+            raise RuntimeError("No documents could be embedded; check the Cohere API key and quota.")
+        
+        # the old table is only dropped once its replacement is ready to be written
+        if stale_table:
+            db.drop_table(table_name)
+        # single write once every batch is done: one Arrow table, one set of fragments
+        table = db.create_table(
+            table_name,
+            data=embedding_table(kept_texts, kept_metadatas, vectors),
+            mode="create"
+        )
+        invalidate_query_caches()
+        ensure_vector_index(table)
+        
+        vector_store = LanceDB(
+            connection=db,
+            table_name=table_name,
+            embedding=embeddings,
+            distance=VECTOR_METRIC
+        )
+        
+        # Create document store for parent documents, persisted so restarts can skip rebuilding it
+        parent_pairs = list(zip(doc_ids, parent_docs))
+        save_parent_store(parent_pairs)
+        docstore = InMemoryStore()
+        docstore.mset(parent_pairs)
+        
+        print(f"Multi-vector setup completed!")
     
-else:
-    print(f"Using existing multi-vector LanceDB table '{table_name}'")
-    # Connect to existing table
-    vector_store = LanceDB(
-        connection=db,
-        table_name=table_name,
-        embedding=embeddings
-    )
+    else:
+        print(f"Using existing multi-vector LanceDB table '{table_name}'")
+        # Connect to existing table (indexing it if an older run left it without one)
+        ensure_vector_index(db.open_table(table_name))
+        vector_store = LanceDB(
+            connection=db,
+            table_name=table_name,
+            embedding=embeddings,
+            distance=VECTOR_METRIC
+        )
+        
+        # Load the persisted document store, rebuilding it only if the file is missing
+        parent_pairs = load_parent_store()
+        if parent_pairs is None:
+            # parent ids are derived from each product, so they still match the stored children
+            print("Parent store not found, rebuilding it from the CSV...")
+            parent_docs, _, doc_ids = create_multi_vector_documents(clean)
+            parent_pairs = list(zip(doc_ids, parent_docs))
+            save_parent_store(parent_pairs)
+        docstore = InMemoryStore()
+        docstore.mset(parent_pairs)
+        
+    return vector_store, docstore
+
+# any-layout int8 views; readonly also accepts read-only buffers
+_QUERY_VECTOR = types.Array(types.int8, 1, 'A', readonly=True)
+_CANDIDATE_VECTORS = types.Array(types.int8, 2, 'A', readonly=True)
+
+@njit(types.float32[:](_QUERY_VECTOR, _CANDIDATE_VECTORS), parallel=True, fastmath=True, cache=True)
+def cosine_scores(query, vectors):
+    """
+    Cosine similarity between int8 `query` and every row of int8 `vectors`, rows scored
+    in parallel; dot products and norms are accumulated exactly in integers.
+    """
+    n, d = vectors.shape
+    query_norm = 0
+    for j in range(d):
+        query_norm += np.int32(query[j]) * query[j]
+    query_norm = np.sqrt(query_norm)
+    
+    scores = np.empty(n, dtype=np.float32)
+    for i in prange(n):
+        dot = 0
+        norm = 0
+        for j in range(d):
+            dot += np.int32(query[j]) * vectors[i, j]
+            norm += np.int32(vectors[i, j]) * vectors[i, j]
+        denom = query_norm * np.sqrt(norm)
+        scores[i] = dot / denom if denom > 0 else 0.0
+    return scores
+
+class RerankingMultiVectorRetriever(MultiVectorRetriever):
+    """
+    MultiVectorRetriever that fetches RERANK_CANDIDATES child vectors from the (approximate)
+    IVF-PQ index, re-scores them with exact cosine similarity and keeps the best `k`
+    before looking up their parent documents.
+    """
     
-    # Recreate document store (in production, you'd want to persist this)
-    parent_docs, child_docs, doc_ids = create_multi_vector_documents(df)
-    docstore = InMemoryStore()
-    docstore.mset(list(zip(doc_ids, parent_docs)))
+    def _get_relevant_documents(self, query: str, *, run_manager) -> List[Document]:
+        k = self.search_kwargs.get("k", 4)
+        query_vector = np.asarray(self.vectorstore.embeddings.embed_query(query), dtype=np.int8)
+        candidates = (
+            self.vectorstore.get_table()
+            .search(query_vector.astype(np.float32), vector_column_name="vector")
+            .metric(VECTOR_METRIC)
+            .limit(RERANK_CANDIDATES)
+            .to_arrow()
+        )
+        if len(candidates) == 0:
+            return []
+        
+        # (N, D) int8 copy of the stored float16 vectors (exact, they hold int8 values)
+        vector_column = candidates["vector"].combine_chunks()
+        vectors = vector_column.flatten().to_numpy().reshape(len(vector_column), -1).astype(np.int8)
+        scores = cosine_scores(query_vector, vectors)
+        best = np.argsort(-scores)[:k]
+        
+        # parents in the order of their best-scoring child
+        metadatas = candidates["metadata"].to_pylist()
+        ids = list(dict.fromkeys(metadatas[i][self.id_key] for i in best))
+        docs = self.docstore.mget(ids)
+        # the docstore keeps lightweight ParentDocs; callers and callbacks get real Documents
+        return [
+            Document(page_content=d.page_content, metadata=dict(d.metadata))
+            for d in docs if d is not None
+        ]
 
 # Create Multi-Vector Retriever
-multi_vector_retriever = MultiVectorRetriever(
-    vectorstore=vector_store,
-    docstore=docstore,
-    id_key="parent_id",  # Key to link child docs to parent docs
-    search_kwargs={"k": 10}  # Retrieve more child docs initially
+@st.cache_resource
+def get_retriever() -> RerankingMultiVectorRetriever:
+    vector_store, docstore = load_or_build_stores(load_clean_df())
+    return RerankingMultiVectorRetriever(
+        vectorstore=vector_store,
+        docstore=docstore,
+        id_key="parent_id",  # Key to link child docs to parent docs
+        search_kwargs={"k": 10}  # Retrieve more child docs initially
+    )
+
+multi_vector_retriever = get_retriever()
+
+# Prompt for the recommendation; {num_products} is deliberately not a template variable
+recommendation_template = """
+You are a product recommender system specialist in GAMING GEAR that helps users find the best products based on their preferences.
+
+Use the following pieces of context to answer the question at the end. The context includes multiple perspectives 
+of each product (features, technical details, summaries, etc.).
+
+For each question, suggest the best products with a short description of the product and the reason why 
+the user might like it. Focus on the most relevant aspects based on the user's query.
+
+If you don't know the answer, just say that you don't know, don't try to make up an answer.
+
+Context:
+{context}
+
+Question: {question}
+
+Your response:
+"""
+
+# Format the retrieved documents into a string
+def format_docs(docs):
+    formatted = []
+    for doc in docs:
+        formatted.append(f"Product: {doc.metadata.get('title', 'Unknown')}")
+        formatted.append(f"Price: {doc.metadata.get('price', 'N/A')}")
+        formatted.append(f"Rating: {doc.metadata.get('rating', 'N/A')}")
+        formatted.append(f"Content: {doc.page_content}")
+        formatted.append("-" * 50)
+    return "\n".join(formatted)
+
+# The LangChain Expression Language (LCEL) chain takes already-retrieved context, so the
+# documents shown as sources are fetched once and the answer can be streamed on its own
+recommendation_chain = (
+    ChatPromptTemplate.from_template(recommendation_template)
+    | groq_llm
+    | StrOutputParser()
 )
 
 def ask_question_multi_vector(query_text: str, num_products: int = 3):
     """
     Ask a question using multi-vector retrieval approach.
     """
-    # Create a template for the prompt - Fixed to not use {num_products} as a template variable
-    template = """
-    You are a product recommender system specialist in GAMING GEAR that helps users find the best products based on their preferences.
-    
-    Use the following pieces of context to answer the question at the end. The context includes multiple perspectives 
-    of each product (features, technical details, summaries, etc.).
-    
-    For each question, suggest the best products with a short description of the product and the reason why 
-    the user might like it. Focus on the most relevant aspects based on the user's query.
-    
-    If you don't know the answer, just say that you don't know, don't try to make up an answer.
-    
-    Context:
-    {context}
-    
-    Question: {question}
-    
-    Your response:
-    """
-    
-    # Format the retrieved documents into a string
-    def format_docs(docs):
-        formatted = []
-        for doc in docs:
-            formatted.append(f"Product: {doc.metadata.get('title', 'Unknown')}")
-            formatted.append(f"Price: {doc.metadata.get('price', 'N/A')}")
-            formatted.append(f"Rating: {doc.metadata.get('rating', 'N/A')}")
-            formatted.append(f"Content: {doc.page_content}")
-            formatted.append("-" * 50)
-        return "\n".join(formatted)
-    
-    # Create the prompt
-    prompt = ChatPromptTemplate.from_template(template)
-    
-    # Create the LangChain Expression Language (LCEL) chain
-    chain = (
-        {"context": multi_vector_retriever | format_docs, "question": RunnablePassthrough()}
-        | prompt
-        | groq_llm
-        | StrOutputParser()
-    )
-    
-    # Execute the chain
     print(f"\nGenerating multi-vector recommendation for: {query_text}")
     
-    # First retrieve documents to display later
-    retrieved_docs = multi_vector_retriever.invoke(query_text)
-    
-    # Run the chain - now only passing the query_text since num_products is not a template variable
-    response = chain.invoke(query_text)
+    retrieved_docs = list(_cached_retrieve(query_text))
+    response = recommendation_chain.invoke(
+        {"context": format_docs(retrieved_docs), "question": query_text}
+    )
     
     # Print the result
     print("\nMulti-Vector Recommendation:")
@@ -355,8 +735,6 @@ def ask_question_multi_vector(query_text: str, num_products: int = 3):
     return {"answer": response, "context": retrieved_docs}
 
 
-st.set_page_config(page_title=" Product Recommender", layout="wide")
-
 st.title(" AI-Powered Product Recommender for Gaming Gear")
 
 st.markdown("""
@@ -375,16 +753,19 @@ if st.button("Find Products"):
         st.warning("Please enter a product-related question or preference.")
     else:
         with st.spinner(" Thinking..."):
-            result = ask_question_multi_vector(query_text=query, num_products=num_sources)
+            docs = _cached_retrieve(query)
         
+        # tokens are rendered as the LLM produces them
         st.subheader(" AI Recommendation")
-        st.markdown(result["answer"])
+        st.write_stream(recommendation_chain.stream(
+            {"context": format_docs(docs), "question": query}
+        ))
         
         st.subheader(" Product Sources Used")
         seen_titles = set()
         source_count = 0
         
-        for doc in result["context"]:
+        for doc in docs:
             title = doc.metadata.get('title', 'Unknown')
             if title not in seen_titles and source_count < num_sources:
                 seen_titles.add(title)
@@ -1,48 +1,47 @@
-import requests
-import concurrent.futures
+import asyncio
+import aiohttp
 import time
-from typing import List
 import random
+from typing import List
+
+# One event loop drives all the checks; this caps how many sockets are open at once
+MAX_CONCURRENT_CHECKS = 500
+
+# Small, stable endpoint: a HEAD to it transfers only headers, and every proxy is
+# tested against the same target so the results are comparable
+TEST_URL = 'https://httpbin.org/ip'
 
-def test_proxy(proxy: str) -> tuple[str, bool]:
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+}
+
+async def test_proxy(session: aiohttp.ClientSession, proxy: str, sem: asyncio.Semaphore) -> tuple[str, bool]:
     """Test if a proxy is working by trying to connect to a test URL"""
-    urls = [
-        'https://www.google.com',
-        'https://www.amazon.com',
-        'https://www.httpbin.org/ip'
-    ]
-    
-    # Format the proxy for requests
-    proxy_dict = {
-        'http': f'http://{proxy}',
-        'https': f'http://{proxy}',
-        'socks4':f'socks4://{proxy}',
-        'socks5':f'socks5://{proxy}'
-    }
+    # aiohttp only tunnels through HTTP proxies (the SOCKS entries were never used by requests either)
+    proxy_url = f'http://{proxy}'
     
-    try:
-        # Try with a random URL from our list
-        url = random.choice(urls)
-        response = requests.get(
-            url,
-            proxies=proxy_dict,
-            timeout=10,
-            headers={
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-            }
-        )
-        if response.status_code == 200:
-            print(f"[SUCCESS] {proxy} is working")
-            return proxy, True
-    except Exception as e:
-        print(f"[FAILED] {proxy} - {str(e)}")
+    async with sem:
+        try:
+            async with session.head(
+                TEST_URL,
+                proxy=proxy_url,
+                allow_redirects=False
+            ) as response:
+                if response.status == 200:
+                    print(f"[SUCCESS] {proxy} is working")
+                    return proxy, True
+        except Exception as e:
+            print(f"[FAILED] {proxy} - {str(e)}")
     return proxy, False
 
 def load_proxies(filename: str) -> List[str]:
-    """Load proxies from file"""
+    """Load proxies from file, without duplicates and in random order"""
     try:
         with open(filename, 'r') as f:
-            return [line.strip() for line in f if line.strip()]
+            proxies = list(dict.fromkeys(line.strip() for line in f if line.strip()))
+        # public lists group proxies by subnet; shuffling spreads the dead ranges out
+        random.shuffle(proxies)
+        return proxies
     except FileNotFoundError:
         print(f"Error: {filename} not found")
         return []
@@ -53,7 +52,21 @@ def save_valid_proxies(valid_proxies: List[str], filename: str):
         for proxy in valid_proxies:
             f.write(f"{proxy}\n")
 
-def validate_proxies(input_file: str, output_file: str, max_workers: int = 10):
+async def test_all_proxies(proxies: List[str], max_concurrency: int) -> List[tuple[str, bool]]:
+    """Test every proxy concurrently on a single event loop"""
+    sem = asyncio.Semaphore(max_concurrency)
+    # One session for every check: the connector's pool and DNS cache are shared, and its
+    # limit (100 by default) must not cap the semaphore. Headers and timeout are set once here.
+    connector = aiohttp.TCPConnector(limit=max_concurrency, ttl_dns_cache=300)
+    async with aiohttp.ClientSession(
+        connector=connector,
+        headers=HEADERS,
+        timeout=aiohttp.ClientTimeout(total=10),
+        raise_for_status=False
+    ) as session:
+        return await asyncio.gather(*(test_proxy(session, proxy, sem) for proxy in proxies))
+
+def validate_proxies(input_file: str, output_file: str, max_concurrency: int = MAX_CONCURRENT_CHECKS):
     """Main function to validate proxies"""
     # Load proxies
     proxies = load_proxies(input_file)
@@ -61,20 +74,10 @@ def validate_proxies(input_file: str, output_file: str, max_workers: int = 10):
         return
     
     print(f"Loaded {len(proxies)} proxies from {input_file}")
-    valid_proxies = []
     
     # Test proxies concurrently
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_proxy = {executor.submit(test_proxy, proxy): proxy for proxy in proxies}
-        
-        for future in concurrent.futures.as_completed(future_to_proxy):
-            proxy = future_to_proxy[future]
-            try:
-                proxy, is_valid = future.result()
-                if is_valid:
-                    valid_proxies.append(proxy)
-            except Exception as e:
-                print(f"Error testing {proxy}: {str(e)}")
+    results = asyncio.run(test_all_proxies(proxies, max_concurrency))
+    valid_proxies = [proxy for proxy, is_valid in results if is_valid]
     
     # Save valid proxies
     if valid_proxies: